@@ -5,18 +5,43 @@ author
 version 0.1
 2016-01-31U
 """
+import os
+import functools
 import sys
 import subprocess
 
+# NSAlert.runModal's return value for the first button added
+NS_ALERT_FIRST_BUTTON_RETURN = 1000
+
+
+@functools.lru_cache(maxsize=1)
+def _get_appkit():
+    """Import PyObjC's AppKit the first time it's needed
+
+    Importing AppKit is slow, so it's only done by periodicals that
+    actually ask the user for confirmation.
+
+    :rtype: module AppKit, or None if PyObjC isn't installed
+    """
+    try:
+        import AppKit
+    except ImportError:
+        return None
+    return AppKit
+
 
 class Platform:
 
-    def __init__(self, supported=tuple()):
+    supported = frozenset()
+
+    def __init__(self, supported=None):
         """Initialize a Platform
 
-        :param supported: tuple[str]
+        :param supported: iterable[str] names of supported methods.
+            default None, use the class's supported frozenset.
         """
-        self.supported = supported
+        if supported is not None:
+            self.supported = frozenset(supported)
 
     def supports(self, method):
         """Check whether a method is supported
@@ -57,16 +82,11 @@ class MacPlatform(Platform):
     """Mac-specific support for additional periodical functionality
     """
 
-    supported = (
+    supported = frozenset((
         'confirm_user',
         'open_path',
         'open_text_file',
-    )
-
-    def __init__(self):
-        super().__init__(
-            supported=self.supported,
-        )
+    ))
 
     def wait_user(self, message, stdout=subprocess.DEVNULL,
                   stderr=subprocess.DEVNULL, timeout=3600, **kwargs):
@@ -81,29 +101,76 @@ class MacPlatform(Platform):
         :param kwargs: dict remaining keyword arguments that will be
             passed to subprocess.call
         """
-        command = ["""osascript <<EOF
-            tell application "System Events"
-                with timeout of 86400 seconds
-                    display dialog "{message}"
-                end timeout
-            end tell\nEOF""".format(
+        script = (
+            'tell application "System Events"\n'
+            '    with timeout of 86400 seconds\n'
+            '        display dialog "{message}"\n'
+            '    end timeout\n'
+            'end tell'
+        ).format(
             #timeout=timeout,
-            message=message
-        )]
+            message=message.replace('\\', '\\\\').replace('"', '\\"')
+        )
+        command = ['/usr/bin/osascript', '-e', script]
+
+        # posix_spawn skips the fork that subprocess would do, but it
+        # can only stand in for subprocess.call's default arguments
+        if (hasattr(os, 'posix_spawn') and not kwargs and
+                stdout == subprocess.DEVNULL and
+                stderr == subprocess.DEVNULL):
+            return self._spawn_silently(command)
+
         exit_code = subprocess.call(
             command,
             stdout=stdout,
             stderr=stderr,
-            shell=True,
             **kwargs
         )
         return exit_code
 
+    @staticmethod
+    def _spawn_silently(command):
+        """Run a command with stdout and stderr sent to os.devnull
+
+        :param command: list[str] absolute path of the executable,
+            followed by its arguments
+        :rtype: int exit code of the command, or the negative signal
+            number if it was killed by a signal
+        """
+        file_actions = [
+            (os.POSIX_SPAWN_OPEN, fd, os.devnull, os.O_WRONLY, 0)
+            for fd in (1, 2)
+        ]
+        pid = os.posix_spawn(
+            command[0], command, os.environ,
+            file_actions=file_actions,
+        )
+        _, status = os.waitpid(pid, 0)
+        if os.WIFSIGNALED(status):
+            return -os.WTERMSIG(status)
+        return os.WEXITSTATUS(status)
+
     def confirm_user(self, message):
         """Get permission from the user
 
+        If PyObjC is installed, the dialog is shown in-process with
+        NSAlert. Otherwise it falls back to an osascript dialog.
+
         :param message: str to display to the user
         """
+        appkit = _get_appkit()
+        if appkit is not None:
+            # a process started by cron or launchd has no application
+            # set up, and would otherwise show the alert behind other
+            # windows
+            application = appkit.NSApplication.sharedApplication()
+            application.activateIgnoringOtherApps_(True)
+            alert = appkit.NSAlert.alloc().init()
+            alert.setMessageText_(message)
+            alert.addButtonWithTitle_('OK')
+            alert.addButtonWithTitle_('Cancel')
+            return alert.runModal() == NS_ALERT_FIRST_BUTTON_RETURN
+
         user_choice = self.wait_user(message)
         proceed = user_choice == 0
         return proceed
@@ -134,47 +201,51 @@ class MacPlatform(Platform):
 
 class LinuxPlatform(Platform):
 
-    supported = tuple()
-
-    def __init__(self):
-        super().__init__(
-            supported=self.supported,
-        )
+    supported = frozenset()
 
 
 class WindowsPlatform(Platform):
 
-    supported = tuple()
+    supported = frozenset()
 
-    def __init__(self):
-        super().__init__(
-            supported=self.supported,
-        )
+
+# sys.platform prefixes, checked in order, and the Platform subclass
+# for each
+_PLATFORM_CLASSES = (
+    ('darwin', MacPlatform),
+    ('linux', LinuxPlatform),
+    ('win', WindowsPlatform),
+)
 
 
 class PlatformFactory:
 
-    @staticmethod
-    def get_platform():
+    _platform = None
+
+    @classmethod
+    def get_platform(cls):
         """Get additional functionality for the underlying platform
 
-        Uses sys.platform.
+        Uses sys.platform. The platform is detected once per process,
+        and the same Platform object is returned on later calls.
 
         :rtype: Platform object corresponding to the host computer
             running this program
         """
+        if cls._platform is None:
+            cls._platform = cls._detect_platform()
+        return cls._platform
 
-        # determine platform
-        platform = sys.platform.lower()
-
-        if 'darwin' in platform:
-            return MacPlatform()
-
-        elif 'linux' in platform:
-            return LinuxPlatform()
+    @staticmethod
+    def _detect_platform():
+        """Create a Platform object for the host computer
 
-        elif platform.startswith('win'):
-            return WindowsPlatform()
+        :rtype: Platform object corresponding to the host computer
+            running this program
+        """
 
-        else:
-            return Platform()
+        platform = sys.platform.lower()
+        for prefix, platform_class in _PLATFORM_CLASSES:
+            if platform.startswith(prefix):
+                return platform_class()
+        return Platform()
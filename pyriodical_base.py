@@ -23,14 +23,63 @@ import os
 import argparse
 import sys
 import logging
-import subprocess
-import traceback
-import datetime
+import errno
+import socket
+import select
+import time
+import functools
+import types
 
 from class_schedule import in_class
 
 from .platforms import PlatformFactory
 
+# connect_ex return codes meaning a non-blocking connect has started
+_CONNECT_IN_PROGRESS = frozenset(
+    getattr(errno, name)
+    for name in ('EINPROGRESS', 'EWOULDBLOCK', 'WSAEWOULDBLOCK')
+    if hasattr(errno, name)
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _performed_file_name(executable, filename_part):
+    """Get the name of a performed file
+
+    Cached, since sys.argv[0] is the same for every periodical created
+    by a script, and filename_part is the same for every instance of
+    a periodical.
+
+    :param executable: str path of the running script, sys.argv[0]
+    :param filename_part: str unique part of the performed file's name
+    :rtype: str path to the performed file
+    """
+    return os.path.join(
+        os.path.dirname(executable),
+        'data',
+        'performed',
+        filename_part + '.txt',
+    )
+
+
+_root_logger_configured = False
+
+
+def _configure_root_logger():
+    """Configure the root logger the first time any periodical logs
+
+    Later calls do nothing, so a process running several periodicals
+    doesn't reset the root logger for each one.
+    """
+    global _root_logger_configured
+    if _root_logger_configured:
+        return
+    _root_logger_configured = True
+
+    logging.basicConfig(level=logging.DEBUG)
+    # set level of root logger
+    logging.getLogger().setLevel(logging.DEBUG)
+
 
 class PyriodicalBase:
 
@@ -45,19 +94,43 @@ class PyriodicalBase:
             don't ask user for confirmation before performing the
             action.
         """
-        self.platform = PlatformFactory.get_platform()
         self.filename_part = filename_part
         self.confirm_user_str = confirm_user_str
-        self.logger = None
+        self._performed_tokens = None
         self.performed_file = self._get_performed_file_name()
-        self.description = '{}\n{}'.format(
+        self.name = type(self).__name__
+
+    @functools.cached_property
+    def platform(self):
+        """Platform-specific functionality, lazy-initialization style.
+
+        :rtype: Platform object from PlatformFactory.get_platform
+        """
+        return PlatformFactory.get_platform()
+
+    @functools.cached_property
+    def description(self):
+        """Description shown in the command line help
+
+        Built the first time it's needed, since periodicals that are
+        used programmatically never show their help.
+
+        :rtype: str the subclass docstring followed by this module's
+        """
+        return '{}\n{}'.format(
             self.__doc__ or '',
             __doc__.format(
                 performed_file=self.performed_file
             ),
         )
-        self.name = type(self).__name__
-        self.arg_parser = self.get_arg_parser()
+
+    @functools.cached_property
+    def arg_parser(self):
+        """Command line argument parser, lazy-initialization style.
+
+        :rtype: argparse.ArgumentParser from get_arg_parser
+        """
+        return self.get_arg_parser()
 
     def get_arg_parser(self):
 
@@ -85,13 +158,12 @@ class PyriodicalBase:
             help="run even if the token has already been run"
         )
 
-        if self.platform.supports('open_text_file'):
-            arg_parser.add_argument(
-                '-e', '--edit-perform-file',
-                default=False, action='store_true',
-                help="open the performed file in the application your"
-                     " platform supports, and exit"
-            )
+        arg_parser.add_argument(
+            '-e', '--edit-perform-file',
+            default=False, action='store_true',
+            help="open the performed file in the application your"
+                 " platform supports, and exit"
+        )
 
         return arg_parser
 
@@ -136,36 +208,146 @@ class PyriodicalBase:
         pass
 
     @staticmethod
-    def can_reach_server(server):
-        # TODO some servers don't accept ping. should handle those cases.
-        command = '/sbin/ping -c 1 {server} -t 1 >>/dev/null 2>&1'.format(server=server)
-        return subprocess.call(command, shell=True) == 0
+    def can_reach_server(server, port=53, timeout=1):
+        """Check whether a TCP connection to the server can be opened
+
+        The default port is DNS, which the public resolvers used by
+        has_internet accept connections on.
+
+        :param server: str host name or IP address to connect to
+        :param port: int TCP port to connect to, default 53
+        :param timeout: int or float in seconds, default 1
+        :rtype: bool True if the connection succeeded, otherwise False
+        """
+        try:
+            with socket.create_connection((server, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def can_reach_any_server(servers, port=53, timeout=1):
+        """Check whether a TCP connection to any of the servers opens
 
-    _has_internet = None
-    _last_internet_check_dt = None
+        All of the connections are attempted at once, so a server that
+        doesn't answer doesn't hold up the others. Returns as soon as
+        one connection succeeds.
+
+        :param servers: iterable[str] host names or IP addresses
+        :param port: int TCP port to connect to, default 53
+        :param timeout: int or float in seconds, default 1
+        :rtype: bool True if any connection succeeded, otherwise False
+        """
+        deadline = time.monotonic() + timeout
+        pending = []
+        try:
+            for server in servers:
+                try:
+                    family, type_, proto, _, address = socket.getaddrinfo(
+                        server, port, type=socket.SOCK_STREAM
+                    )[0]
+                    sock = socket.socket(family, type_, proto)
+                except OSError:
+                    continue
+                sock.setblocking(False)
+                error = sock.connect_ex(address)
+                if error == 0:
+                    sock.close()
+                    return True
+                # anything other than "in progress" means the connect
+                # already failed, e.g. ENETUNREACH when there's no
+                # route, and the socket would still select as writable
+                if error not in _CONNECT_IN_PROGRESS:
+                    sock.close()
+                    continue
+                pending.append(sock)
+
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Windows reports a failed connect as an exception
+                # rather than as writable
+                _, connected, failed = select.select(
+                    [], pending, pending, remaining
+                )
+                for sock in failed:
+                    if sock in pending:
+                        pending.remove(sock)
+                        sock.close()
+                for sock in connected:
+                    if sock not in pending:
+                        continue
+                    error = sock.getsockopt(
+                        socket.SOL_SOCKET, socket.SO_ERROR
+                    )
+                    if error == 0:
+                        return True
+                    pending.remove(sock)
+                    sock.close()
+            return False
+        finally:
+            for sock in pending:
+                sock.close()
+
+    # seconds to trust the last internet check, depending on whether
+    # it found a connection. Each further check with the same result
+    # doubles the time after a success, up to INTERNET_TTL_OK_MAX, and
+    # halves it after a failure, down to INTERNET_TTL_FAIL_MIN.
+    INTERNET_TTL_OK = 900
+    INTERNET_TTL_OK_MAX = 3600
+    INTERNET_TTL_FAIL = 10
+    INTERNET_TTL_FAIL_MIN = 1
+
+    # (time.monotonic() of the last check, result of the last check,
+    # number of consecutive checks with that result)
+    _internet_cache = None
 
     @classmethod
-    def has_internet(cls):
-        # haven't checked yet, so immediately check and return
-        if cls._last_internet_check_dt is None:
-            cls._last_internet_check_dt = datetime.datetime.now()
-            cls._has_internet = (
-                cls.can_reach_server('8.8.8.8')
-                or cls.can_reach_server('8.8.4.4')
+    def _internet_ttl(cls, result, streak):
+        """Get how long to trust an internet check
+
+        :param result: bool result of the last check
+        :param streak: int number of consecutive checks, including
+            the last one, that had the same result
+        :rtype: float seconds to reuse the result for
+        """
+        if result:
+            return min(
+                cls.INTERNET_TTL_OK_MAX,
+                cls.INTERNET_TTL_OK * 2 ** (streak - 1),
             )
-            return cls._has_internet
+        return max(
+            cls.INTERNET_TTL_FAIL_MIN,
+            cls.INTERNET_TTL_FAIL / 2 ** (streak - 1),
+        )
 
-        last_checked_internet_minutes = (datetime.datetime.now() - cls._last_internet_check_dt).total_seconds() / 60
-        if cls._has_internet and last_checked_internet_minutes < 1:
-            return cls._has_internet
+    @classmethod
+    def has_internet(cls):
+        """Check whether this computer can reach the internet
 
-        cls._has_internet = (
-            cls.can_reach_server('8.8.8.8')
-            or cls.can_reach_server('8.8.4.4')
-        )
-        cls._last_internet_check_dt = datetime.datetime.now()
+        The result is cached on the class. A connection that has been
+        up for several checks is re-checked less and less often, and
+        one that has been down for several checks is re-checked more
+        and more often, so it's noticed soon after it comes back.
 
-        return cls._has_internet
+        :rtype: bool True if a public DNS server could be reached,
+            otherwise False
+        """
+        now = time.monotonic()
+        streak = 0
+        if cls._internet_cache is not None:
+            checked_at, last_result, streak = cls._internet_cache
+            if now - checked_at < cls._internet_ttl(last_result, streak):
+                return last_result
+
+        result = cls.can_reach_any_server(('8.8.8.8', '8.8.4.4'))
+        if streak and result == last_result:
+            streak += 1
+        else:
+            streak = 1
+        cls._internet_cache = (now, result, streak)
+        return result
 
     def _edit_perform_file(self):
         """Edit the "performed" file
@@ -176,11 +358,20 @@ class PyriodicalBase:
         pass
 
     def _ensure_performed_file(self):
-        """Ensure that the performed file exists
+        """Ensure that the performed file and its directory exist
+
+        Create the directory for the performed file and the file
+        itself if they don't already exist. Opening for append creates
+        the file when it's missing and leaves it untouched otherwise,
+        so there's no need to check for it first. The raw os.open
+        skips building a Python file object that would never be used.
         """
-        if not os.path.exists(self.performed_file):
-            with open(self.performed_file, 'a') as fw:
-                print('', end='', file=fw)
+        os.makedirs(os.path.dirname(self.performed_file), exist_ok=True)
+        os.close(os.open(
+            self.performed_file,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        ))
 
     def _have_performed(self, token):
         """Check if have performed for the current token
@@ -191,16 +382,6 @@ class PyriodicalBase:
         """
         return self._get_last_performed() == token
 
-    def _ensure_performed_file_dir(self):
-        """Ensure the directory for the performed file exists
-
-        Create the directory for the performed file if it doesn't
-        already exist.
-        """
-        performed_file_dir = os.path.dirname(self.performed_file)
-        if not os.path.exists(performed_file_dir):
-            os.makedirs(performed_file_dir)
-
     def _mark_performed(self, token):
         """Record that we have performed the task
 
@@ -212,8 +393,37 @@ class PyriodicalBase:
 
         :param token: str token for this run
         """
-        with open(self.performed_file, 'a') as fw:
-            print(token, file=fw)
+        self._mark_performed_batch((token,))
+
+    def _mark_performed_batch(self, tokens):
+        """Record that we have performed several tokens at once
+
+        All of the tokens are appended with a single write, in order.
+        The performed file is opened for each batch rather than held
+        open, so a file that was replaced since the last batch (e.g.
+        saved by an editor) still gets the tokens. O_APPEND makes each
+        small write atomic, so concurrent runs can't interleave their
+        tokens.
+
+        :param tokens: iterable[str] tokens to record, oldest first
+        """
+        data = ''.join('{}\n'.format(token) for token in tokens).encode()
+        if not data:
+            return
+        fd = os.open(
+            self.performed_file,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            # os.write may write only part of a large batch, e.g. when
+            # interrupted by a signal, so keep writing until it's all
+            # out; a full disk raises OSError instead
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
 
     def make_unique_token(self):
         """Make a unique token that represents one run of this script
@@ -264,24 +474,28 @@ class PyriodicalBase:
         raise NotImplementedError("make_unique_token must be "
                                   "overridden in subclass")
 
-    def get_logger(self):
-        """Get a logger, lazy-initialization style.
+    @functools.cached_property
+    def logger(self):
+        """Logger, lazy-initialization style.
 
         The logger will be named after the subclass so that the log
         messages will make more sense.
 
         :rtype: logging.Logger corresponding to the subclass
         """
+        _configure_root_logger()
 
-        if self.logger is None:
+        logger = logging.getLogger(self.name)
+        logger.setLevel(level=logging.DEBUG)
+        return logger
 
-            logging.basicConfig(level=logging.DEBUG)
-            # set level of root logger
-            logging.getLogger().setLevel(logging.DEBUG)
+    def get_logger(self):
+        """Get a logger, lazy-initialization style.
 
-            self.logger = logging.getLogger(self.name)
-            self.logger.setLevel(level=logging.DEBUG)
+        Kept for subclasses that call it; same as the logger attribute.
 
+        :rtype: logging.Logger corresponding to the subclass
+        """
         return self.logger
 
     def _get_performed_file_name(self):
@@ -289,51 +503,101 @@ class PyriodicalBase:
 
         :rtype: str absolute path to the name of the performed file
         """
-        executable = sys.argv[0]
-        dirname = os.path.dirname(executable)
-
-        filename = os.path.join(
-            dirname,
-            'data',
-            'performed',
-            self.filename_part + '.txt',
-        )
-
-        return filename
+        return _performed_file_name(sys.argv[0], self.filename_part)
 
     def _get_last_performed(self):
         """Get the most recent token that was performed successfully
 
+        Reads backwards from the end of the performed file, so the
+        cost doesn't grow as the history of tokens accumulates. The
+        window read from the end is doubled until it contains a
+        complete line.
+
         :rtype: str token corresponding to the most recent run
         """
-        last_perform = None
-        with open(self.performed_file, 'r') as fr:
-            try:
-                last_perform = next(fr)
-            except StopIteration:
-                return None
-            for last_perform in fr:
-                pass
-
-        if last_perform is not None:
-            last_perform = last_perform.strip()
-
-        return last_perform
+        block_size = 4096
+        with open(self.performed_file, 'rb') as fr:
+            size = fr.seek(0, os.SEEK_END)
+            while True:
+                start = max(0, size - block_size)
+                fr.seek(start)
+                lines = fr.read(size - start).splitlines()
+                # unless we read from the beginning of the file, the
+                # first line may be the partial end of a longer line
+                if start > 0:
+                    lines = lines[1:]
+                for line in reversed(lines):
+                    line = line.strip()
+                    if line:
+                        return line.decode()
+                if start == 0:
+                    return None
+                block_size *= 2
 
     def did_perform_token(self, token):
         """Check if the given token was performed
 
+        The most recent token is checked first, since that's the
+        common case. Otherwise the whole performed file is searched
+        through a memory map, rather than line by line.
+
         :param token: str token to check for
         :rtype: bool True if this token was performed, otherwise False
         """
-        performed = False
-        with open(self.performed_file, 'r') as fr:
-            for line in fr:
-                if line.strip() == token:
-                    performed = True
-                    break
+        if self._get_last_performed() == token:
+            return True
+        return self._find_token(token)
+
+    def _find_token(self, token):
+        """Search the whole performed file for the given token
 
-        return performed
+        The set of performed tokens is kept on the instance, keyed by
+        the file's modification time and size, so it's only rebuilt
+        after the performed file changes.
+
+        :param token: str token to search for
+        :rtype: bool True if the token is a line of the performed
+            file, otherwise False
+        """
+        stat = os.stat(self.performed_file)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._performed_tokens is None or self._performed_tokens[0] != key:
+            self._performed_tokens = (
+                key, frozenset(self._read_performed_lines())
+            )
+        return token.encode() in self._performed_tokens[1]
+
+    def _read_performed_lines(self):
+        """Read every performed token in one pass
+
+        :rtype: list[bytes] non-blank lines of the performed file,
+            stripped, oldest first
+        """
+        with open(self.performed_file, 'rb') as fr:
+            lines = (line.strip() for line in fr.read().splitlines())
+            return [line for line in lines if line]
+
+    @classmethod
+    def bulk_status(cls, pairs):
+        """Get the performed status of several periodicals at once
+
+        Each periodical's performed file is read once, for both its
+        last token and whether the given token was performed.
+
+        :param pairs: iterable[tuple[PyriodicalBase, str]] periodicals
+            and the token to check for each
+        :rtype: dict[str, tuple[str, bool]] keyed by each periodical's
+            filename_part, of the last performed token (None if
+            nothing was performed) and whether the token was performed
+        """
+        statuses = {}
+        for periodical, token in pairs:
+            lines = periodical._read_performed_lines()
+            statuses[periodical.filename_part] = (
+                lines[-1].decode() if lines else None,
+                token.encode() in lines,
+            )
+        return statuses
 
     def could_run_now(self, token):
         """Check if running this periodical would start a run
@@ -341,9 +605,9 @@ class PyriodicalBase:
         :param token: str token for the run to check
         :rtype: bool True if it could perform now, otherwise False
         """
-        perfd_this_token = self.did_perform_token(token)
-        should_perform = self.should_perform_now()
-        return should_perform and not perfd_this_token
+        if not self.should_perform_now():
+            return False
+        return not self.did_perform_token(token)
 
     def _get_status(self, token):
         """Get the status of this periodical
@@ -376,10 +640,12 @@ class PyriodicalBase:
         :param token: str token that would be valid for a current run
         :rtype: str describing the status
         """
-        last_token = self._get_last_performed()
-        perfd_this_token = self.did_perform_token(token)
+        # read the performed file once for both of the token facts
+        lines = self._read_performed_lines()
+        last_token = lines[-1].decode() if lines else None
+        perfd_this_token = token.encode() in lines
         should_perform = self.should_perform_now()
-        cld_run_now = self.could_run_now(token)
+        cld_run_now = should_perform and not perfd_this_token
         return (
             "periodical name:          {periodical_name}\n"
             "could run now:            {cld_run_now}\n"
@@ -396,36 +662,72 @@ class PyriodicalBase:
             cld_run_now=cld_run_now,
         )
 
+    def _parse_args(self):
+        """Parse the command line arguments
+
+        Cron runs periodicals without arguments, and in that case the
+        defaults are returned without building the argument parser.
+        If get_arg_parser is overridden, or this instance's parser has
+        already been built (and so may have had arguments added to
+        it), the parser is always used, so those arguments' defaults
+        and requirements still apply.
+
+        :rtype: argparse.Namespace or types.SimpleNamespace of the
+            command line arguments
+        """
+        if (len(sys.argv) == 1 and
+                type(self).get_arg_parser is PyriodicalBase.get_arg_parser
+                and 'arg_parser' not in self.__dict__):
+            return types.SimpleNamespace(
+                status=False,
+                could_run_now=False,
+                force=False,
+                edit_perform_file=False,
+            )
+        return self.arg_parser.parse_args()
+
     def needs_internet(self):
         return False
 
     def main(self, log=False):
         """Run the periodical
         """
-        cl_args = self.arg_parser.parse_args()
+        cl_args = self._parse_args()
+        edit_perform_file = cl_args.edit_perform_file
+        show_status = cl_args.status
+        show_could_run_now = cl_args.could_run_now
+
+        # a plain run that shouldn't perform now can exit before
+        # touching the performed file or making a token
+        if not (edit_perform_file or show_status or show_could_run_now):
+            if not self.should_perform_now():
+                return
 
         # create performed directory and file if they don't exist
-        self._ensure_performed_file_dir()
         self._ensure_performed_file()
 
-        if getattr(cl_args, 'edit_perform_file', False):
+        if edit_perform_file:
+            if not self.platform.supports('open_text_file'):
+                print("editing the performed file isn't supported on "
+                      "this platform", file=sys.stderr)
+                return 1
             self.platform.open_text_file(self.performed_file)
             return
 
+        # make_unique_token may be expensive in subclasses, so it's
+        # only called once the paths that don't need a token are done
         token = self.make_unique_token()
-        if getattr(cl_args, 'status', False):
+        if show_status:
             print(self._get_status(token))
             return
-        if getattr(cl_args, 'could_run_now', False):
+        if show_could_run_now:
             print('could run now: {} {}'.format(
                 self.could_run_now(token), self.name
             ))
             return
 
-        # shouldn't perform now, or already performed
-        if not self.should_perform_now():
-            return
-        if self._have_performed(token) and not cl_args.force:
+        # already performed
+        if not cl_args.force and self._have_performed(token):
             return
 
         # if this periodical requires confirmation before executing,
@@ -441,20 +743,21 @@ class PyriodicalBase:
 
         if needs_internet and not has_internet:
             if log:
-                self.get_logger().error(
+                self.logger.error(
                     "need internet but has no internet; can't perform; exiting"
                 )
             return 1
 
         if log:
-            self.get_logger().info("performing {}".format(self.name))
+            self.logger.info("performing {}".format(self.name))
 
         try:
             success = self.perform()
         except KeyboardInterrupt:
             raise
         except Exception as exception:
-            print(traceback.format_exc())
+            if log:
+                self.logger.exception("perform failed")
             self.recover_from_error(exception)
             raise
 
@@ -0,0 +1,132 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from .pyriodical_base import PyriodicalBase
+
+
+class CanReachAnyServerTest(unittest.TestCase):
+
+    def _can_reach_with_connect_ex(self, connect_ex_result):
+        sock = mock.MagicMock()
+        sock.connect_ex.return_value = connect_ex_result
+        with mock.patch('socket.socket', return_value=sock):
+            return PyriodicalBase.can_reach_any_server(
+                ['8.8.8.8', '8.8.4.4'], timeout=0.1
+            )
+
+    def test_unreachable_network_is_not_reachable(self):
+        # with no route, connect fails at once and SO_ERROR stays 0
+        self.assertFalse(self._can_reach_with_connect_ex(errno.ENETUNREACH))
+
+    def test_immediate_connect_is_reachable(self):
+        self.assertTrue(self._can_reach_with_connect_ex(0))
+
+
+class ArgParserTest(unittest.TestCase):
+
+    def test_instances_get_separate_parsers(self):
+        class Periodical(PyriodicalBase):
+            def __init__(self, filename_part):
+                super().__init__(filename_part)
+                self.arg_parser.add_argument('--foo')
+
+        first = Periodical('first')
+        second = Periodical('second')
+        self.assertIsNot(first.arg_parser, second.arg_parser)
+        self.assertIn('first', first.arg_parser.description)
+        self.assertIn('second', second.arg_parser.description)
+
+    def test_get_arg_parser_override_sees_its_own_instance(self):
+        class Periodical(PyriodicalBase):
+            def get_arg_parser(self):
+                arg_parser = super().get_arg_parser()
+                arg_parser.add_argument('--day', default=self.filename_part)
+                return arg_parser
+
+        Periodical('alpha').arg_parser
+        beta = Periodical('beta')
+        self.assertEqual(beta.arg_parser.parse_args([]).day, 'beta')
+
+
+class MarkPerformedTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.periodical = PyriodicalBase('test')
+        self.periodical.performed_file = os.path.join(
+            directory.name, 'test.txt'
+        )
+
+    def test_tokens_reach_a_replaced_file(self):
+        performed_file = self.periodical.performed_file
+        self.periodical._mark_performed('first')
+        with open(performed_file + '.new', 'w') as fw:
+            print('edited', file=fw)
+        os.replace(performed_file + '.new', performed_file)
+
+        self.periodical._mark_performed('second')
+        with open(performed_file) as fr:
+            self.assertEqual(fr.read(), 'edited\nsecond\n')
+
+    def test_short_writes_are_continued(self):
+        real_write = os.write
+
+        def write_one_byte(fd, data):
+            return real_write(fd, bytes(data[:1]))
+
+        with mock.patch('os.write', side_effect=write_one_byte):
+            self.periodical._mark_performed_batch(['first', 'second'])
+        with open(self.periodical.performed_file) as fr:
+            self.assertEqual(fr.read(), 'first\nsecond\n')
+
+
+class GetLastPerformedTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.periodical = PyriodicalBase('test')
+        self.periodical.performed_file = os.path.join(
+            directory.name, 'test.txt'
+        )
+
+    def _last_performed(self, contents):
+        with open(self.periodical.performed_file, 'w') as fw:
+            fw.write(contents)
+        return self.periodical._get_last_performed()
+
+    def test_empty_file(self):
+        self.assertIsNone(self._last_performed(''))
+
+    def test_blank_lines_only(self):
+        self.assertIsNone(self._last_performed('\n  \n'))
+
+    def test_trailing_blank_lines_are_skipped(self):
+        self.assertEqual(self._last_performed('first\nlast\n\n'), 'last')
+
+    def test_trailing_whitespace_line_is_skipped(self):
+        self.assertEqual(self._last_performed('first\nlast\n  \n'), 'last')
+
+    def test_last_line_exactly_fills_window(self):
+        last = 'x' * 4095
+        self.assertEqual(self._last_performed('first\n' + last + '\n'), last)
+
+    def test_whole_file_exactly_fills_window(self):
+        last = 'x' * 4095
+        self.assertEqual(self._last_performed(last + '\n'), last)
+
+    def test_last_line_longer_than_window(self):
+        last = 'x' * 10000
+        self.assertEqual(self._last_performed('first\n' + last + '\n'), last)
+
+    def test_many_short_lines(self):
+        contents = ''.join('{}\n'.format(i) for i in range(5000))
+        self.assertEqual(self._last_performed(contents), '4999')
+
+
+if __name__ == '__main__':
+    unittest.main()